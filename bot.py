@@ -1,12 +1,18 @@
 import datetime as dt
-import json
+import hashlib
 import os
 import time
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
 
+import orjson
 import requests
 import schedule
+import zstandard as zstd
 from dateutil import tz
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # === Config ===
 AOC_YEAR = int(os.getenv("AOC_YEAR", dt.datetime.now().year))
@@ -14,32 +20,102 @@ AOC_LEADERBOARD_ID = os.environ["AOC_LEADERBOARD_ID"]
 AOC_SESSION = os.environ["AOC_SESSION"]
 SLACK_WEBHOOK_URL = os.environ["SLACK_WEBHOOK_URL"]
 TIMEZONE = os.getenv("TZ", "Europe/Berlin")
+_TZ = tz.gettz(TIMEZONE)
 
 STATE_FILE = Path(os.getenv("STATE_FILE", "/data/aoc_state.json"))
 AOC_URL = f"https://adventofcode.com/{AOC_YEAR}/leaderboard/private/view/{AOC_LEADERBOARD_ID}.json"
 
 
+# === HTTP session ===
+
+# One keep-alive pool shared by AoC and Slack requests, so the TCP/TLS
+# handshake is not repeated on every poll and every announcement.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+))
+_SESSION.headers.update({"User-Agent": "aoc-slack-webhook-bot"})
+
+
 # === AoC fetching & parsing ===
 
+# Validators and parsed result of the last leaderboard response, used for conditional GETs.
+_LAST_ETAG = None
+_LAST_MODIFIED = None
+_LAST_BOARD = None
+# Hash of the last response body, for servers that don't honour the validators.
+_LAST_BODY_HASH = None
+
+
 def fetch_leaderboard():
-    headers = {
-        "Cookie": f"session={AOC_SESSION}",
-        "User-Agent": "aoc-slack-webhook-bot"
-    }
-    resp = requests.get(AOC_URL, headers=headers, timeout=10)
+    """Fetch the leaderboard as ``(star_keys, ts_by_key, member_by_id)``.
+
+    Returns the cached tuple unchanged on 304 Not Modified or when the body is identical
+    to the last one, so callers can detect "nothing changed" by identity.
+    """
+    global _LAST_ETAG, _LAST_MODIFIED, _LAST_BOARD, _LAST_BODY_HASH
+    headers = {}
+    if _LAST_BOARD is not None:
+        if _LAST_ETAG:
+            headers["If-None-Match"] = _LAST_ETAG
+        if _LAST_MODIFIED:
+            headers["If-Modified-Since"] = _LAST_MODIFIED
+    # Explicit header rather than a cookie jar entry, so the session token is not sent on to redirect targets.
+    headers["Cookie"] = f"session={AOC_SESSION}"
+    resp = _SESSION.get(AOC_URL, headers=headers, timeout=10)
+    if resp.status_code == 304:
+        return _LAST_BOARD
     resp.raise_for_status()
-    return resp.json()
+    body_hash = hashlib.blake2b(resp.content, digest_size=8).digest()
+    if body_hash != _LAST_BODY_HASH:
+        # Only remember the hash once the body parsed, so a bad body keeps failing loudly.
+        board = extract_stars_and_index(orjson.loads(resp.content))
+        _LAST_BODY_HASH = body_hash
+        _LAST_BOARD = board
+    # Validators are taken only from a response whose body is the cached board.
+    _LAST_ETAG = resp.headers.get("ETag")
+    _LAST_MODIFIED = resp.headers.get("Last-Modified")
+    return _LAST_BOARD
+
+
+def star_key(member_id, day, part):
+    """Pack a star into one int: member id in the high bits, then day (1-25) and part (1-2)."""
+    return (int(member_id) << 8) | (day << 2) | part
+
+
+def unpack_star_key(key):
+    return key >> 8, (key >> 2) & 0x3F, key & 0x3
+
 
+def extract_stars_and_index(leaderboard_json):
+    """Reduce the raw leaderboard to its star keys, their timestamps and the member fields the jobs use.
 
-def extract_star_set(leaderboard_json):
-    star_set = set()
+    Only the reduced form is kept around between ticks, not the full JSON tree, and member
+    names are resolved to their display form here once per fetched leaderboard.
+    """
+    star_keys = set()
+    add = star_keys.add
+    ts_by_key = {}
+    member_by_id = {}
     members = leaderboard_json.get("members", {})
     for member_id, member in members.items():
-        completion = member.get("completion_day_level", {})
-        for day_str, parts in completion.items():
+        # Same packing as star_key(), with the per-member and per-day parts hoisted out.
+        member_bits = int(member_id) << 8
+        for day_str, parts in member.get("completion_day_level", {}).items():
+            day_bits = member_bits | (int(day_str) << 2)
             for part_str, info in parts.items():
-                star_set.add((str(member_id), int(day_str), info.get('get_star_ts'), int(part_str)))
-    return star_set
+                key = day_bits | int(part_str)
+                add(key)
+                ts_by_key[key] = info["get_star_ts"]
+        member_by_id[member["id"]] = {
+            "id": member["id"],
+            "name": member_name(member),
+            "local_score": member.get("local_score", 0),
+            "stars": member.get("stars", 0),
+        }
+    return star_keys, ts_by_key, member_by_id
 
 
 def member_name(member):
@@ -49,20 +125,43 @@ def member_name(member):
     return name
 
 
+@lru_cache(maxsize=1024)
+def format_star_ts(ts):
+    # Stars earned in the same second (common right after a puzzle unlocks) share one strftime call.
+    return dt.datetime.fromtimestamp(ts, _TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+
+
 # === State handling ===
 
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_ZSTD_COMPRESSOR = zstd.ZstdCompressor(level=3)
+_ZSTD_DECOMPRESSOR = zstd.ZstdDecompressor()
+
+
 def load_previous_star_set():
     if not STATE_FILE.exists():
         return set()
-    with STATE_FILE.open("r", encoding="utf-8") as f:
-        raw = json.load(f)
-    return {(str(m), int(d), t, int(p)) for m, d, t, p in raw}
+    data = STATE_FILE.read_bytes()
+    # The path keeps its old name; plain JSON written before compression is read as-is.
+    if data.startswith(_ZSTD_MAGIC):
+        data = _ZSTD_DECOMPRESSOR.decompress(data)
+    raw = orjson.loads(data)
+    # Older state files hold [member_id, day, ts, part] entries instead of packed keys.
+    return {
+        entry if isinstance(entry, int) else star_key(entry[0], int(entry[1]), int(entry[3]))
+        for entry in raw
+    }
 
 
-def save_star_set(star_set):
-    as_list = [[m, d, t, p] for (m, d, t, p) in sorted(star_set)]
-    with STATE_FILE.open("w", encoding="utf-8") as f:
-        json.dump(as_list, f, indent=2)
+def save_star_set(star_keys):
+    # Order and indentation don't matter to the loader, so skip both.
+    # Write to a temp file and swap it in, so a crash mid-write can't leave a truncated state file.
+    tmp = STATE_FILE.with_name(STATE_FILE.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(_ZSTD_COMPRESSOR.compress(orjson.dumps(list(star_keys))))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, STATE_FILE)
 
 
 # === Slack webhook helper ===
@@ -70,7 +169,7 @@ def save_star_set(star_set):
 def slack_post(text):
     payload = {"text": text}
     try:
-        resp = requests.post(SLACK_WEBHOOK_URL, json=payload, timeout=10)
+        resp = _SESSION.post(SLACK_WEBHOOK_URL, json=payload, timeout=10)
         if not resp.ok:
             print(f"Slack webhook error: {resp.status_code} {resp.text}")
     except Exception as e:
@@ -79,71 +178,81 @@ def slack_post(text):
 
 # === Jobs ===
 
+# Stars already announced; loaded from STATE_FILE in main() and kept in memory afterwards.
+_PREV_STARS = set()
+# Leaderboard object handled by the last job_check_new_stars run.
+_LAST_CHECKED_LB = None
+
+
 def job_check_new_stars():
+    global _PREV_STARS, _LAST_CHECKED_LB
     print("[job_check_new_stars] Running...")
     lb = fetch_leaderboard()
-    current = extract_star_set(lb)
-    previous = load_previous_star_set()
+    if lb is _LAST_CHECKED_LB:
+        print("Leaderboard not modified.")
+        return
 
-    new_stars = current - previous
+    current, ts_by_key, member_by_id = lb
+    new_stars = current - _PREV_STARS
     if not new_stars:
+        _LAST_CHECKED_LB = lb
         print("No new stars.")
         return
 
-    members = lb.get("members", {})
-    member_by_id = {str(m["id"]): m for m in members.values()}
-
-    tzinfo = tz.gettz(TIMEZONE)
-
-    for member_id, day, ts, part in sorted(new_stars, key=lambda x: x[2]):
+    msgs = []
+    for key in sorted(new_stars, key=ts_by_key.__getitem__):
+        member_id, day, part = unpack_star_key(key)
+        ts = ts_by_key[key]
         m = member_by_id.get(member_id)
-        display_name = member_name(m) if m else f"Member {member_id}"
+        display_name = m["name"] if m else f"Member {member_id}"
 
-        dt_local = dt.datetime.fromtimestamp(ts, tzinfo)
-        ts_str = dt_local.strftime("%Y-%m-%d %H:%M:%S %Z")
+        ts_str = format_star_ts(ts)
 
         part_text = "Part 1" if part == 1 else "Part 2"
         msg = f"{display_name} solved Day {day} {part_text} ⭐ at {ts_str}"
 
         print("Announcing:", msg)
-        slack_post(msg)
+        msgs.append(msg)
 
+    # One webhook call for the whole batch, e.g. when a puzzle unlocks.
+    slack_post("\n".join(msgs))
     save_star_set(current)
+    _PREV_STARS = current
+    _LAST_CHECKED_LB = lb
 
 
 def job_daily_summary():
-    now = dt.datetime.now(tz.gettz(TIMEZONE))
+    now = dt.datetime.now(_TZ)
     if now.month != 12:
         print("Not december yet, so no board posted.")
         return
     print("[job_daily_summary] Running...")
-    lb = fetch_leaderboard()
-    current = extract_star_set(lb)
-    previous = load_previous_star_set()
-    new_stars = current - previous
+    current, _, member_by_id = fetch_leaderboard()
+    new_stars = current - _PREV_STARS
     if not new_stars:
         print("No Changes. Not posting leaderboard.")
         return
-    members = list(lb.get("members", {}).values())
+    members = list(member_by_id.values())
 
-    members.sort(key=lambda m: m.get("local_score", 0), reverse=True)
-    max_name_len = (max(len(member_name(m)) for m in members))
-    max_name_len = max(max_name_len, 30)
+    members.sort(key=itemgetter("local_score"), reverse=True)
+    names = [m["name"] for m in members]
+    max_name_len = max(max(map(len, names), default=0), 30)
 
-    now = dt.datetime.now(tz.gettz(TIMEZONE))
+    now = dt.datetime.now(_TZ)
     header = f"*Advent of Code {AOC_YEAR} – Stand {now.strftime('%Y-%m-%d %H:%M')}*"
 
+    line_fmt = "%%3d. %%-%ds: %%3d* – %%5d pts" % max_name_len
     lines = []
+    append = lines.append
     rank = 0
     prev_score = None
-    for idx, m in enumerate(members, start=1):
-        name = member_name(m)
+    for idx, (m, name) in enumerate(zip(members, names), start=1):
         stars = m.get("stars", 0)
         score = m.get("local_score", 0)
         if score != prev_score:
             prev_score = score
             rank = idx
-        lines.append(f"{rank:>3}. {name:<{max_name_len}}: {stars:>3}* – {score:>5} pts")
+        append(line_fmt % (rank, name, stars, score))
 
     text = header + "\n\n" + "```\n" + "\n".join(lines) + "\n```"
     print("Posting daily summary")
@@ -152,11 +261,14 @@ def job_daily_summary():
 
 
 def main():
+    global _PREV_STARS
     if not STATE_FILE.exists():
         print("Initializing state from current leaderboard so we don't back-announce old stars.")
-        lb = fetch_leaderboard()
-        current = extract_star_set(lb)
+        current, _, _ = fetch_leaderboard()
         save_star_set(current)
+        _PREV_STARS = current
+    else:
+        _PREV_STARS = load_previous_star_set()
 
     schedule.every(15).minutes.do(job_check_new_stars)
     schedule.every().day.at("05:59").do(job_daily_summary)
@@ -164,7 +276,8 @@ def main():
     print("Scheduler started.")
     while True:
         schedule.run_pending()
-        time.sleep(5)
+        # Sleep until the next job is due instead of polling the job list.
+        time.sleep(max(1, schedule.idle_seconds()))
 
 
 if __name__ == "__main__":